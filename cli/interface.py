@@ -1,38 +1,74 @@
 import sys
 from typing import List, Dict, Any, Optional
 
-from nginx.manager import NginxManager
-from nginx.config_builder import NginxConfigBuilder
 from cli.validators import validate_domain, validate_port, validate_path
+from utils.system import is_root
+
+# Accepted answers for yes/no questions
+_YN = {"y": True, "yes": True, "n": False, "no": False}
+
+# Main menu, written in a single call per loop iteration
+_MENU = (
+    "=== Nginx Interactive Manager ===\n"
+    "1) List configs\n"
+    "2) Create config\n"
+    "3) Show config details\n"
+    "4) Delete config\n"
+    "5) Quit\n"
+)
 
 class CLI:
     """Command-line interface for the Nginx Manager."""
 
     def __init__(self):
-        self.manager = NginxManager()
-        self.builder = NginxConfigBuilder()
+        # Created on first use so that startup and the quit path stay cheap
+        self._manager = None
+        self._builder = None
+
+    @property
+    def manager(self):
+        """Nginx manager, imported and instantiated on first access."""
+        if self._manager is None:
+            from nginx.manager import NginxManager
+            self._manager = NginxManager()
+        return self._manager
+
+    @property
+    def builder(self):
+        """Config builder, imported and instantiated on first access."""
+        if self._builder is None:
+            from nginx.config_builder import NginxConfigBuilder
+            self._builder = NginxConfigBuilder()
+        return self._builder
+
+    def _read_line(self, text: str) -> str:
+        """Write a prompt and read one stripped line from stdin (no readline editing)."""
+        sys.stdout.write(text)
+        sys.stdout.flush()
+        line = sys.stdin.readline()
+        if not line:
+            # Match input(): end of input must not look like an empty answer
+            raise EOFError
+        return line.strip()
 
     def prompt(self, text: str, default: Optional[str] = None) -> str:
         """Prompt the user for input with optional default value."""
         if default is None:
-            return input(f"{text}: ").strip()
+            return self._read_line(f"{text}: ")
         else:
-            resp = input(f"{text} [{default}]: ").strip()
+            resp = self._read_line(f"{text} [{default}]: ")
             return resp if resp else default
 
     def confirm(self, text: str, default: bool = False) -> bool:
         """Ask user for yes/no confirmation."""
-        yes = {"y", "yes"}
-        no = {"n", "no"}
         default_str = "Y/n" if default else "y/N"
         while True:
-            resp = input(f"{text} ({default_str}): ").strip().lower()
+            resp = self._read_line(f"{text} ({default_str}): ").lower()
             if not resp:
                 return default
-            if resp in yes:
-                return True
-            if resp in no:
-                return False
+            ans = _YN.get(resp)
+            if ans is not None:
+                return ans
             print("  Please answer yes or no.")
 
     def create_config(self) -> None:
@@ -97,23 +133,15 @@ class CLI:
         if use_ssl:
             add_redirect = self.confirm("Also generate HTTP->HTTPS redirect block?", default=True)
 
-        server_conf = self.builder.build(domain, cfg, locations, ssl=use_ssl, redirect=False)
-        blocks = [server_conf]
-        
-        if add_redirect:
-            blocks.insert(0, self.builder.build(domain, cfg, locations, ssl=False, redirect=True))
-
-        full_conf = "\n\n".join(blocks)
+        conf_parts = self.builder.build_parts(domain, cfg, locations, ssl=use_ssl, redirect=add_redirect)
         
-        print("\n--- Preview of Generated Config ---\n")
-        print(full_conf)
-        print()
+        sys.stdout.writelines(["\n--- Preview of Generated Config ---\n\n", *conf_parts, "\n\n"])
 
         if not self.confirm("Write config and enable?", default=False):
             print("Canceled. No files written.\n")
             return
 
-        if not self.manager.write_and_enable(domain, full_conf):
+        if not self.manager.write_and_enable(domain, conf_parts):
             return
 
         if use_ssl and self.confirm(f"Run Certbot now? (will execute: sudo certbot --nginx -d {domain})", default=True):
@@ -123,14 +151,21 @@ class CLI:
         """Delete an existing Nginx configuration."""
         print("\n=== Delete an Existing Nginx Config ===")
         self.manager.list_configs()
-        domain = self.prompt("Enter config name to delete (without .conf)")
-        if not domain:
+        domains = self.prompt("Enter config name(s) to delete (without .conf, space-separated)").split()
+        if not domains:
             print("⚠️  No config name provided. Canceling.\n")
             return
-        if not self.confirm(f"Are you sure you want to delete {domain}.conf?", default=False):
+        names = ", ".join(f"{domain}.conf" for domain in domains)
+        if not self.confirm(f"Are you sure you want to delete {names}?", default=False):
             print("Canceled.\n")
             return
-        self.manager.delete_config(domain)
+        if len(domains) == 1:
+            self.manager.delete_config(domains[0])
+            return
+        # One nginx test and reload for the whole batch
+        with self.manager.deferred_reload():
+            for domain in domains:
+                self.manager.delete_config(domain)
 
     def show_config(self) -> None:
         """Show the contents of a configuration file."""
@@ -144,16 +179,13 @@ class CLI:
 
     def main_loop(self) -> None:
         """Main application loop."""
-        if not self.manager.require_root():
+        # Checked directly so that the manager is still only created on first use
+        if not is_root():
+            print("🚨 This operation requires root privileges (sudo).")
             sys.exit(1)
             
         while True:
-            print("=== Nginx Interactive Manager ===")
-            print("1) List configs")
-            print("2) Create config")
-            print("3) Show config details")
-            print("4) Delete config") 
-            print("5) Quit")
+            sys.stdout.write(_MENU)
             choice = self.prompt("Choice", "5")
 
             if choice == "1":
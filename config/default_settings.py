@@ -9,6 +9,7 @@ NGINX_PATHS = {
     'logs_dir': '/var/log/nginx',
     'conf_d': '/etc/nginx/conf.d',
     'nginx_conf': '/etc/nginx/nginx.conf',
+    'pid_file': '/run/nginx.pid',
 }
 
 # Certbot paths
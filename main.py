@@ -1,4 +1,6 @@
 #!/usr/bin/env python3
+import argparse
+import logging
 import os
 import sys
 from pathlib import Path
@@ -11,8 +13,18 @@ from utils.system import check_environment
 
 def main():
     """Main entry point for the Nginx Manager application."""
+    parser = argparse.ArgumentParser(description="Interactive Nginx configuration manager")
+    parser.add_argument("-y", "--yes", action="store_true",
+                        help="fix environment issues (broken symlinks, missing directories) without asking")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="show the external commands being run")
+    args = parser.parse_args()
+
+    # Command output from utils.system goes through logging; show it as plain messages
+    logging.basicConfig(format="%(message)s", level=logging.DEBUG if args.verbose else logging.INFO)
+
     # Check environment prerequisites
-    if not check_environment():
+    if not check_environment(assume_yes=args.yes):
         sys.exit(1)
     
     try:
@@ -1,26 +1,76 @@
-from typing import List, Dict, Tuple, Any, Optional
-from pathlib import Path
+import functools
+import io
+import os
+import string
+from typing import Callable, List, Dict, Tuple, Any, Optional
 
 from nginx.templates import (
     SERVER_BLOCK_TEMPLATE, 
     REDIRECT_SERVER_BLOCK, 
     PROXY_LOCATION_BLOCK,
     STATIC_SERVER_DIRECTIVES,
-    SECURITY_HEADERS,
+    SECURITY_HEADERS_BLOCK,
     SSL_CONFIG_BLOCK,
-    RATE_LIMITING,
+    RATE_LIMITING_BLOCK,
     LOG_FORMAT_MAIN
 )
 
+# SSL directives that are only emitted when the file they reference exists
+_OPTIONAL_SSL_DIRECTIVES = ("include", "ssl_dhparam")
+
+def _compile_template(template: str) -> Callable[[Dict[str, Any]], str]:
+    """
+    Pre-parse a str.format template into literal chunks and named field slots.
+    
+    The returned function renders the template from a dict of parameters
+    without re-tokenizing it. Only plain named fields ({name}) are supported.
+    """
+    chunks: List[str] = []
+    slots: List[Tuple[int, str]] = []
+    for literal, field, spec, conversion in string.Formatter().parse(template):
+        if literal:
+            chunks.append(literal)
+        if field is None:
+            continue
+        if not field.isidentifier() or spec or conversion:
+            raise ValueError(f"Unsupported template field: {{{field}}}")
+        slots.append((len(chunks), field))
+        chunks.append("")
+
+    def render(params: Dict[str, Any]) -> str:
+        parts = chunks.copy()
+        for index, field in slots:
+            parts[index] = str(params[field])
+        return "".join(parts)
+
+    return render
+
 class NginxConfigBuilder:
     """Builds Nginx configuration files based on predefined templates and security best practices."""
 
     def __init__(self):
         # Define ssl template directives
         self.ssl_block = SSL_CONFIG_BLOCK
-        self.security_headers = SECURITY_HEADERS
-        self.rate_limiting = RATE_LIMITING
+        # Pre-render "directive value;" templates so build() only fills in the domain
+        self._ssl_line_templates = [
+            (directive, f"{directive} {template};")
+            for directive, template in self.ssl_block
+        ]
+        self._optional_ssl_files = [
+            (directive, template)
+            for directive, template in self.ssl_block
+            if directive in _OPTIONAL_SSL_DIRECTIVES
+        ]
+        # Constant blocks, joined once at import time in nginx.templates
+        self.security_headers = SECURITY_HEADERS_BLOCK
+        self.rate_limiting = RATE_LIMITING_BLOCK
         self.log_format = LOG_FORMAT_MAIN
+        # Log format header and server block as one template, so build() does a single format pass
+        escaped_log_format = self.log_format.replace("{", "{{").replace("}", "}}")
+        self._config_template = escaped_log_format + "\n" + SERVER_BLOCK_TEMPLATE
+        self._render_config = _compile_template(self._config_template)
+        # Memoize rendered server blocks; build() converts its arguments to hashable keys
+        self._render_cached = functools.lru_cache(maxsize=32)(self._render)
         
     def build(self, domain: str, cfg: Dict[str, Any], locations: List[Dict[str, Any]], 
               ssl: bool = False, redirect: bool = False) -> str:
@@ -38,28 +88,46 @@ class NginxConfigBuilder:
             Complete Nginx server configuration as a string
         """
         if redirect:
-            return REDIRECT_SERVER_BLOCK.format(domain=domain)
-        
+            return self.build_redirect(domain)
+
+        cfg_items = tuple(sorted(cfg.items()))
+        location_items = tuple((loc['path'], tuple(loc['directives'])) for loc in locations)
+        # Probed on every call, not cached: Certbot creates these files on its
+        # first run, so the answer can change during a session
+        ssl_present = self._present_ssl_files(domain) if ssl else None
+        return self._render_cached(domain, cfg_items, location_items, ssl_present)
+
+    def _present_ssl_files(self, domain: str) -> Tuple[str, ...]:
+        """Return the optional SSL directives whose referenced file exists for a domain."""
+        return tuple(
+            directive for directive, template in self._optional_ssl_files
+            if os.path.exists(template.format(domain=domain))
+        )
+
+    def _render(self, domain: str, cfg_items: Tuple[Tuple[str, Any], ...],
+                location_items: Tuple[Tuple[str, Tuple[Tuple[str, str], ...]], ...],
+                ssl_present: Optional[Tuple[str, ...]]) -> str:
+        """Render a server block from the hashable form of build()'s arguments; ssl_present is None without SSL."""
+        cfg = dict(cfg_items)
+
         location_blocks = []
         if cfg['mode'] == 'proxy':
             location_blocks.append(self._build_proxy_location(cfg['path'], cfg['proxy_pass']))
         
-        for loc in locations:
-            location_blocks.append(self._build_custom_location(loc['path'], loc['directives']))
+        for path, directives in location_items:
+            location_blocks.append(self._build_custom_location(path, directives))
         
         log_config = self._build_log_config(domain)
-        security_config = self._build_security_config()
-        ssl_config = self._build_ssl_config(domain) if ssl else ""
-        rate_limiting = "\n    ".join(self.rate_limiting)
+        ssl_config = self._build_ssl_config(domain, ssl_present) if ssl_present is not None else ""
         
         server_params = {
             "domain": domain,
             "port": cfg['listen'],
             "locations": "\n\n".join(location_blocks),
             "ssl_config": ssl_config,
-            "security_headers": security_config,
+            "security_headers": self.security_headers,
             "log_config": log_config,
-            "rate_limiting": rate_limiting
+            "rate_limiting": self.rate_limiting
         }
         
         if cfg['mode'] == 'static':
@@ -73,20 +141,47 @@ class NginxConfigBuilder:
         else:
             server_params["static_directives"] = ""
         
-        config = self.log_format + "\n" + SERVER_BLOCK_TEMPLATE.format(**server_params)
+        config = self._render_config(server_params)
         return config
 
+    def build_parts(self, domain: str, cfg: Dict[str, Any], locations: List[Dict[str, Any]],
+                    ssl: bool = False, redirect: bool = False) -> List[str]:
+        """
+        Build the complete file contents as a list of string parts.
+        
+        Args:
+            domain: Domain name
+            cfg: Configuration dictionary
+            locations: List of location blocks
+            ssl: Whether to include SSL configuration
+            redirect: Whether to prepend an HTTP to HTTPS redirect block
+            
+        Returns:
+            The redirect block (if requested) and the server block, ready to be
+            streamed or written without joining
+        """
+        server_conf = self.build(domain, cfg, locations, ssl=ssl)
+        if not redirect:
+            return [server_conf]
+        return [self.build_redirect(domain), "\n\n", server_conf]
+
+    def build_redirect(self, domain: str) -> str:
+        """Build the HTTP to HTTPS redirect server block for a domain."""
+        return REDIRECT_SERVER_BLOCK.format(domain=domain)
+
     def _build_proxy_location(self, path: str, proxy_pass: str) -> str:
         """Build a proxy location block."""
         return PROXY_LOCATION_BLOCK.format(path=path, proxy_pass=proxy_pass)
         
     def _build_custom_location(self, path: str, directives: List[Tuple[str, str]]) -> str:
         """Build a custom location block with directives."""
-        lines = [f"location {path} {{"]
+        buf = io.StringIO()
+        w = buf.write
+        w(f"location {path} {{\n")
         for directive, value in directives:
-            lines.append(f"    {directive} {value};")
-        lines.append("}")
-        return "\n".join(lines)
+            w(f"    {directive} {value};\n")
+        w("}")
+        return buf.getvalue()
         
     def _build_log_config(self, domain: str) -> str:
         """Build logging configuration for a domain."""
@@ -96,17 +191,12 @@ class NginxConfigBuilder:
     error_log /var/log/nginx/{domain}/error.log warn;
     """
         
-    def _build_security_config(self) -> str:
-        """Build security headers configuration."""
-        return "\n    ".join(self.security_headers)
-        
-    def _build_ssl_config(self, domain: str) -> str:
-        """Build SSL configuration for a domain."""
+    def _build_ssl_config(self, domain: str, present: Tuple[str, ...]) -> str:
+        """Build SSL configuration for a domain, given the optional directives whose file exists."""
         ssl_lines = []
-        for directive, template in self.ssl_block:
-            value = template.format(domain=domain)
-            if directive in ("include", "ssl_dhparam") and not Path(value).exists():
+        for directive, line in self._ssl_line_templates:
+            if directive in _OPTIONAL_SSL_DIRECTIVES and directive not in present:
                 continue
-            ssl_lines.append(f"{directive} {value};")
+            ssl_lines.append(line.format(domain=domain))
         
         return "\n    ".join(ssl_lines)
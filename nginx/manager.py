@@ -1,13 +1,89 @@
+import codecs
+import contextlib
+import heapq
 import os
 import re
-import subprocess
-import shutil
+import signal
+import stat
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import Iterator, List, Dict, Sequence, Tuple, Optional, Union
 
 from config.default_settings import NGINX_PATHS
 from utils.system import run_command
 
+# One pass over a config collects server_name, listen port, proxy_pass and ssl_certificate
+_CONF_FACTS_RE = re.compile(r"server_name\s+([^;]+);|listen\s+(\d+)|(proxy_pass)|(ssl_certificate)")
+_SANITIZE_RE = re.compile(r"[^\w.-]")
+
+# Generated configs keep their identifying directives near the top
+_CONF_HEAD_BYTES = 8192
+# Matches ending this close to the end of the head may be cut short by the read
+# boundary ("listen 8|0"); they are left for the scan of the rest of the file.
+# A directive longer than this that straddles the boundary can be missed.
+_CONF_OVERLAP_CHARS = 512
+_NO_FACTS: Tuple[Optional[str], Optional[str], bool, bool] = (None, None, False, False)
+
+def _read_conf_facts(path: str) -> Tuple[Optional[str], Optional[str], bool, bool]:
+    """Read _conf_facts() from the head of a file, scanning only the rest if the head was not enough."""
+    with open(path, "rb") as f:
+        head = f.read(_CONF_HEAD_BYTES)
+        if len(head) < _CONF_HEAD_BYTES:
+            return _conf_facts(head.decode("utf-8", errors="replace"))
+        # Incremental, so a multi-byte character split by the read decodes correctly
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        text = decoder.decode(head)
+        facts, resume = _scan_conf_facts(text, _NO_FACTS, len(text) - _CONF_OVERLAP_CHARS)
+        if all(facts):
+            return facts
+        rest = f.read()
+    tail = text[resume:] + decoder.decode(rest, final=True)
+    return _scan_conf_facts(tail, facts)[0]
+
+def _lstat_or_none(path: Path) -> Optional[os.stat_result]:
+    """lstat() a path, returning None if it does not exist."""
+    try:
+        return os.lstat(path)
+    except FileNotFoundError:
+        return None
+
+def _unlink_if_exists(path: Path) -> None:
+    """Remove a file or symlink, ignoring it if already gone."""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+def _conf_facts(content: str) -> Tuple[Optional[str], Optional[str], bool, bool]:
+    """Return (server_name, port, uses proxy_pass, has ssl_certificate) from the first matches in content."""
+    return _scan_conf_facts(content, _NO_FACTS)[0]
+
+def _scan_conf_facts(content: str, facts: Tuple[Optional[str], Optional[str], bool, bool],
+                     limit: Optional[int] = None) -> Tuple[Tuple[Optional[str], Optional[str], bool, bool], Optional[int]]:
+    """
+    Merge the facts found in content into facts, stopping at the first match that ends past limit.
+    
+    Returns the merged facts and the offset to resume scanning from (None without a limit).
+    """
+    domain, port, proxy, ssl = facts
+    resume = limit
+    for m in _CONF_FACTS_RE.finditer(content):
+        if limit is not None and m.end() > limit:
+            resume = m.start()
+            break
+        if m.group(1) is not None:
+            if domain is None:
+                domain = m.group(1).strip()
+        elif m.group(2) is not None:
+            if port is None:
+                port = m.group(2)
+        elif m.group(3) is not None:
+            proxy = True
+        else:
+            ssl = True
+        if domain is not None and port is not None and proxy and ssl:
+            break
+    return (domain, port, proxy, ssl), resume
+
 class NginxManager:
     """Manages Nginx configuration files and operations."""
     
@@ -15,30 +91,39 @@ class NginxManager:
         self.avail = Path(NGINX_PATHS['sites_available'])
         self.enabled = Path(NGINX_PATHS['sites_enabled'])
         self.logs_dir = Path(NGINX_PATHS['logs_dir'])
+        self.pid_file = Path(NGINX_PATHS['pid_file'])
+        # Set once ensure_directories() has succeeded; the directories are not removed mid-session
+        self._dirs_ready = False
+        # Sorted sites-available listing, keyed on the directory mtime
+        self._conf_cache_mtime = -1
+        self._conf_cache: List[Tuple[str, str]] = []
+        # State for deferred_reload(): configs written inside the block, and whether nginx needs a reload
+        self._deferring = False
+        self._pending_reload = False
+        self._staged: List[Tuple[Path, Path]] = []
+        # Outcome of the last deferred_reload() block: True if nginx was tested and
+        # reloaded (or nothing needed it), False if the batch failed, None before any batch
+        self.last_batch_ok: Optional[bool] = None
         
-    def require_root(self) -> bool:
-        """Check if the script is running with root privileges."""
-        if os.geteuid() != 0:
-            print("🚨 This operation requires root privileges (sudo).")
-            return False
-        return True
-
     def ensure_directories(self) -> bool:
         """Ensure all required Nginx directories exist."""
+        if self._dirs_ready:
+            return True
         try:
             for dir_path in [self.avail, self.enabled, self.logs_dir]:
                 if not dir_path.exists():
                     print(f"Creating directory: {dir_path}")
                     dir_path.mkdir(parents=True, exist_ok=True)
+            self._dirs_ready = True
             return True
         except Exception as e:
             print(f"❌ Error creating directories: {e}")
             return False
 
-    def list_configs(self) -> List[Dict[str, str]]:
-        """List all available Nginx configurations and their details."""
+    def list_configs(self, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """List available Nginx configurations and their details, optionally only the first `limit`."""
         print("\n--- Existing Nginx Configs ---")
-        confs = sorted(self.avail.glob("*.conf"))
+        confs = self._conf_files(limit)
         if not confs:
             print("  (none)\n")
             return []
@@ -47,18 +132,16 @@ class NginxManager:
         print("-" * 65)
         
         result = []
-        for conf in confs:
-            content = conf.read_text()
-            m_name = re.search(r"server_name\s+([^;]+);", content)
-            domain = m_name.group(1).strip() if m_name else "-"
-            m_listen = re.search(r"listen\s+([\d]+)", content)
-            port = m_listen.group(1) if m_listen else "-"
-            typ = "proxy" if "proxy_pass" in content else "static"
-            ssl = "yes" if "ssl_certificate" in content else "no"
-            print(f"{conf.name:<20} {domain:<25} {port:<6} {typ:<7} {ssl:<5}")
+        for name, path in confs:
+            m_domain, m_port, is_proxy, has_ssl = _read_conf_facts(path)
+            domain = m_domain or "-"
+            port = m_port or "-"
+            typ = "proxy" if is_proxy else "static"
+            ssl = "yes" if has_ssl else "no"
+            print(f"{name:<20} {domain:<25} {port:<6} {typ:<7} {ssl:<5}")
             
             result.append({
-                "name": conf.name,
+                "name": name,
                 "domain": domain,
                 "port": port,
                 "type": typ,
@@ -67,83 +150,66 @@ class NginxManager:
         print()
         return result
 
-    def write_and_enable(self, domain: str, full_conf: str) -> bool:
-        """Write and enable a Nginx configuration for a domain."""
+    def write_and_enable(self, domain: str, full_conf: Union[str, Sequence[str]]) -> bool:
+        """Write and enable a Nginx configuration for a domain (given as a string or a list of parts)."""
         if not self.ensure_directories():
             return False
             
         safe_domain = self._sanitize_domain(domain)
         dest = self.avail / f"{safe_domain}.conf"
+        self._invalidate_conf_cache()
         
         try:
             log_dir = self.logs_dir / safe_domain
             log_dir.mkdir(exist_ok=True, parents=True)
             
-            dest.write_text(full_conf + "\n")
+            self._write_atomic(dest, full_conf)
             print(f"[+] Written: {dest}")
             
             link = self.enabled / dest.name
             
-            if link.exists():
-                if link.is_symlink():
+            # One lstat: a dangling symlink must be replaced too, and needs no target stat
+            link_st = _lstat_or_none(link)
+            if link_st is not None:
+                if stat.S_ISLNK(link_st.st_mode):
                     link.unlink()
                     print(f"[-] Removed existing symlink: {link}")
                 else:
                     backup = link.with_suffix('.conf.bak')
-                    shutil.move(link, backup)
+                    os.replace(link, backup)
                     print(f"[-] Backed up regular file: {link} → {backup}")
             
-            if not dest.exists():
-                print(f"❌ Error: Target file {dest} does not exist!")
-                return False
-            
             try:
                 relative_path = os.path.relpath(dest, link.parent)
                 os.symlink(relative_path, link)
                 print(f"[+] Enabled: {link} → {relative_path}")
-            except Exception as e1:
+            except OSError as e1:
                 print(f"Could not create relative symlink: {e1}")
+                absolute_path = dest.absolute()
                 try:
-                    os.symlink(dest.absolute(), link)
-                    print(f"[+] Enabled: {link} → {dest.absolute()}")
-                except Exception as e2:
-                    print(f"Could not create absolute symlink: {e2}")
-                    try:
-                        if run_command(["ln", "-sf", str(dest.absolute()), str(link.absolute())]):
-                            print(f"[+] Enabled using ln command: {link}")
-                        else:
-                            raise Exception("ln command failed")
-                    except Exception as e3:
-                        print(f"❌ All symlink methods failed! {e3}")
-                        if dest.exists():
-                            dest.unlink()
-                        return False
-
-            if not link.exists():
-                print(f"❌ Symlink creation failed: {link} does not exist")
-                if dest.exists():
-                    dest.unlink()
-                return False
-                
-            target_path = Path(os.path.realpath(link))
-            if not target_path.exists():
-                print(f"❌ Symlink target does not exist: {link} → {target_path}")
-                link.unlink()
-                if dest.exists():
-                    dest.unlink()
-                return False
+                    os.symlink(absolute_path, link)
+                    print(f"[+] Enabled: {link} → {absolute_path}")
+                except OSError as e2:
+                    print(f"❌ Could not create symlink: {e2}")
+                    _unlink_if_exists(dest)
+                    return False
+
+            # dest was just written and the link created to it, so there is nothing to re-probe;
+            # nginx -t below validates the result.
+            if self._deferring:
+                self._staged.append((dest, link))
+                self._pending_reload = True
+                return True
 
             print("\nTesting nginx syntax...")
-            if not run_command(["nginx", "-t"]):
+            if not self._test_config():
                 print("❌ Nginx configuration test failed. Rolling back changes...")
-                if link.exists():
-                    link.unlink()
-                if dest.exists():
-                    dest.unlink()
+                _unlink_if_exists(link)
+                _unlink_if_exists(dest)
                 return False
                 
             print("Reloading nginx...")
-            if not run_command(["nginx", "-s", "reload"]):
+            if not self._reload():
                 print("❌ Nginx reload failed.")
                 return False
                 
@@ -152,8 +218,7 @@ class NginxManager:
             
         except Exception as e:
             print(f"❌ Error applying configuration: {e}")
-            if dest.exists():
-                dest.unlink()
+            _unlink_if_exists(dest)
             return False
 
     def delete_config(self, domain: str) -> bool:
@@ -161,31 +226,33 @@ class NginxManager:
         safe_domain = self._sanitize_domain(domain)
         avail_f = self.avail / f"{safe_domain}.conf"
         enabled_f = self.enabled / f"{safe_domain}.conf"
+        self._invalidate_conf_cache()
         
         try:
-            if not avail_f.exists() and not enabled_f.exists():
+            # lstat so that a dangling symlink in sites-enabled is still found and removed
+            enabled_st = _lstat_or_none(enabled_f)
+            avail_exists = avail_f.exists()
+            if not avail_exists and enabled_st is None:
                 print(f"⚠️ No configuration found for {domain}")
                 return False
                 
-            if enabled_f.exists():
+            if enabled_st is not None:
                 enabled_f.unlink()
                 print(f"[-] Disabled: {enabled_f}")
                 
-            if avail_f.exists():
+            if avail_exists:
                 avail_f.unlink()
                 print(f"[-] Removed: {avail_f}")
             
-            if enabled_f.exists() and enabled_f.is_symlink():
-                target = Path(os.readlink(enabled_f))
-                if not target.exists():
-                    enabled_f.unlink()
-                    print(f"[-] Removed broken symlink: {enabled_f}")
-            
-            if not run_command(["nginx", "-t"]):
+            if self._deferring:
+                self._pending_reload = True
+                return True
+
+            if not self._test_config():
                 print("⚠️ Nginx configuration test failed after deletion.")
                 return False
                 
-            if not run_command(["nginx", "-s", "reload"]):
+            if not self._reload():
                 print("⚠️ Nginx reload failed after deletion.")
                 return False
             
@@ -196,6 +263,52 @@ class NginxManager:
             print(f"❌ Error removing configuration: {e}")
             return False
 
+    @contextlib.contextmanager
+    def deferred_reload(self) -> Iterator[None]:
+        """
+        Batch several write_and_enable/delete_config calls behind one nginx test and reload.
+        
+        Inside the block, changes are applied to disk but nginx is neither tested nor
+        reloaded; that happens once when the block exits. If the test fails, configs
+        written inside the block are rolled back. Nested blocks defer to the outermost.
+        The outcome is stored in last_batch_ok when the outermost block exits.
+        """
+        if self._deferring:
+            yield
+            return
+
+        self._deferring = True
+        try:
+            yield
+        finally:
+            self._deferring = False
+            staged, self._staged = self._staged, []
+            pending, self._pending_reload = self._pending_reload, False
+            self.last_batch_ok = self._apply_staged(staged) if pending else True
+
+    def _apply_staged(self, staged: List[Tuple[Path, Path]]) -> bool:
+        """Test and reload nginx once for a batch of changes, rolling back staged writes on failure."""
+        print("\nTesting nginx syntax...")
+        if not self._test_config():
+            if not staged:
+                # Delete-only batch: there is nothing to roll back
+                print("⚠️ Nginx configuration test failed after deletion.")
+                return False
+            print("❌ Nginx configuration test failed. Rolling back written configs...")
+            for dest, link in staged:
+                _unlink_if_exists(link)
+                _unlink_if_exists(dest)
+            self._invalidate_conf_cache()
+            return False
+
+        print("Reloading nginx...")
+        if not self._reload():
+            print("⚠️ Nginx reload failed after deletion." if not staged else "❌ Nginx reload failed.")
+            return False
+
+        print("✅ Applied!\n")
+        return True
+
     def show_config(self, domain: str) -> Optional[str]:
         """Show the configuration for a domain."""
         safe_domain = self._sanitize_domain(domain)
@@ -204,10 +317,10 @@ class NginxManager:
         if not conf_file.exists():
             print(f"⚠️ {safe_domain}.conf not found in sites-available.")
             enabled_file = self.enabled / f"{safe_domain}.conf"
-            if enabled_file.exists():
-                if enabled_file.is_symlink():
-                    target = Path(os.readlink(enabled_file))
-                    print(f"⚠️ Found only as symlink in sites-enabled pointing to {target}")
+            enabled_st = _lstat_or_none(enabled_file)
+            if enabled_st is not None:
+                if stat.S_ISLNK(enabled_st.st_mode):
+                    print(f"⚠️ Found only as symlink in sites-enabled pointing to {os.readlink(enabled_file)}")
                 else:
                     content = enabled_file.read_text()
                     print(f"\n--- {domain}.conf content (from sites-enabled) ---\n")
@@ -222,6 +335,64 @@ class NginxManager:
         print()
         return content
 
+    def _write_atomic(self, dest: Path, content: Union[str, Sequence[str]]) -> None:
+        """Write content and a trailing newline to dest via a temp file, so nginx never sees a partial file."""
+        parts = [content] if isinstance(content, str) else list(content)
+        parts.append("\n")
+        data = memoryview("".join(parts).encode("utf-8"))
+        tmp = dest.with_suffix(".conf.tmp")
+        try:
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                # Normally a single write(); loop only in case of a short write
+                while data:
+                    data = data[os.write(fd, data):]
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            os.replace(tmp, dest)
+        except Exception:
+            if tmp.exists():
+                tmp.unlink()
+            raise
+
+    def _test_config(self) -> bool:
+        """Run nginx's syntax check; -q keeps only error output, which goes to stderr."""
+        return run_command(["nginx", "-t", "-q"], capture=False)
+
+    def _reload(self) -> bool:
+        """Ask the running nginx to reload its configuration."""
+        # Same as `nginx -s reload`, without starting a second nginx that re-parses the config
+        try:
+            os.kill(int(self.pid_file.read_text().strip()), signal.SIGHUP)
+            return True
+        except (OSError, ValueError):
+            return run_command(["nginx", "-s", "reload"], capture=False)
+
+    def _conf_files(self, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+        """Return sorted (name, path) pairs for .conf files in sites-available, rescanning only when the directory changed."""
+        try:
+            mtime = self.avail.stat().st_mtime_ns
+        except FileNotFoundError:
+            return []
+        if mtime == self._conf_cache_mtime:
+            return self._conf_cache if limit is None else self._conf_cache[:limit]
+        with os.scandir(self.avail) as it:
+            entries = ((e.name, e.path) for e in it if e.name.endswith(".conf") and e.is_file())
+            if limit is not None:
+                # Partial listing: select the first names without sorting (or caching) everything
+                return heapq.nsmallest(limit, entries)
+            self._conf_cache = sorted(entries)
+        self._conf_cache_mtime = mtime
+        return self._conf_cache
+
+    def _invalidate_conf_cache(self) -> None:
+        """Force the next listing to rescan sites-available."""
+        self._conf_cache_mtime = -1
+
     def _sanitize_domain(self, domain: str) -> str:
         """Sanitize domain name for safe filename usage."""
-        return re.sub(r'[^\w.-]', '_', domain)
+        # Common case: only word characters, dots and dashes, so nothing to substitute
+        if domain.replace('.', '').replace('-', '').replace('_', '').isalnum():
+            return domain
+        return _SANITIZE_RE.sub('_', domain)
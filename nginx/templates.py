@@ -116,3 +116,6 @@ RATE_LIMITING = [
     "limit_req zone=one burst=10 nodelay;"  # Removed limit_req_zone directive - this must be in http context
 ]
 
+# Pre-joined blocks, indented for the server block template
+SECURITY_HEADERS_BLOCK = "\n    ".join(SECURITY_HEADERS)
+RATE_LIMITING_BLOCK = "\n    ".join(RATE_LIMITING)
@@ -1,124 +1,293 @@
+import functools
+import logging
 import os
 import sys
-import subprocess
 import shutil
-from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
-def check_environment() -> bool:
+log = logging.getLogger(__name__)
+
+_SITES_ENABLED = '/etc/nginx/sites-enabled'
+_SITES_AVAILABLE = '/etc/nginx/sites-available'
+
+# Répertoires Nginx requis
+# Listed as (parent, children) pairs in creation order, so that the children
+# of a missing parent are known to be missing without a stat
+_NGINX_DIRS = (
+    ('/etc/nginx', (_SITES_AVAILABLE, _SITES_ENABLED)),
+    ('/var/log/nginx', ()),
+)
+
+# Scan sites-enabled through one directory fd, with readlink/stat/unlink
+# resolving names relative to it instead of re-walking the full path
+_USE_DIR_FD = (os.scandir in os.supports_fd
+               and {os.readlink, os.stat, os.unlink} <= os.supports_dir_fd)
+
+# The effective UID is fixed for the life of the process
+_EUID = os.geteuid()
+
+# Usual install locations, probed by _is_installed() before walking PATH.
+# A PATH match always takes precedence when choosing which binary to run;
+# these are only used to run a tool that is installed but not on PATH.
+_KNOWN_BINARIES = {
+    'nginx': ('/usr/local/sbin/nginx', '/usr/sbin/nginx', '/usr/bin/nginx'),
+    'certbot': ('/usr/local/bin/certbot', '/usr/bin/certbot', '/snap/bin/certbot'),
+}
+
+@functools.lru_cache(maxsize=None)
+def _which(name: str) -> Optional[str]:
+    """shutil.which(), memoized: PATH and installed binaries do not change during a run."""
+    return shutil.which(name)
+
+@functools.lru_cache(maxsize=None)
+def _known_binary(name: str) -> Optional[str]:
+    """Return the first executable usual install location for name, if any."""
+    for candidate in _KNOWN_BINARIES.get(name, ()):
+        if os.access(candidate, os.X_OK):
+            return candidate
+    return None
+
+def _executable(name: str) -> Optional[str]:
+    """Resolve the binary to run for name: PATH first, then the usual install locations."""
+    return _which(name) or _known_binary(name)
+
+def _is_installed(name: str) -> bool:
+    """Return True if an executable called name is installed, checking the usual locations first."""
+    return _known_binary(name) is not None or _which(name) is not None
+
+def _collect_issues() -> Tuple[List[Tuple[str, str]], List[str], List[str]]:
+    """
+    Inspect the Nginx layout without changing anything or prompting.
+    
+    Returns:
+        Tuple of (broken symlinks as (link, target) pairs, missing
+        directories in creation order, warning messages)
+    """
+    # Check for inconsistent symlinks in sites-enabled
+    # Plain strings and os.path throughout: no pathlib objects per entry
+    broken_symlinks = []
+    sites_enabled = _SITES_ENABLED
+    
+    # Existence per target, so that aliases of one target are only stat'ed once
+    target_cache = {}
+    dir_fd = None
+    try:
+        if _USE_DIR_FD:
+            # Entry paths are then bare names, resolved against dir_fd
+            dir_fd = os.open(sites_enabled, os.O_RDONLY | os.O_DIRECTORY)
+            entries = os.scandir(dir_fd)
+        else:
+            entries = os.scandir(sites_enabled)
+    except OSError:
+        entries = None
+        if dir_fd is not None:
+            os.close(dir_fd)
+            dir_fd = None
+    if entries is not None:
+        try:
+            # One scandir pass: is_symlink() comes from the directory entry, no extra lstat
+            with entries as it:
+                for entry in it:
+                    if not entry.name.endswith('.conf') or not entry.is_symlink():
+                        continue
+                    link_target = os.readlink(entry.path, dir_fd=dir_fd)
+                    target = link_target
+                    # POSIX link targets are absolute exactly when they start with '/'
+                    if not target.startswith('/'):
+                        # Convert relative path to absolute
+                        target = os.path.normpath(os.path.join(sites_enabled, target))
+                    exists = target_cache.get(target)
+                    if exists is None:
+                        # A relative target resolves against dir_fd exactly as the kernel follows the link
+                        try:
+                            os.stat(target if dir_fd is None else link_target, dir_fd=dir_fd)
+                            exists = True
+                        except OSError:
+                            exists = False
+                        target_cache[target] = exists
+                    if not exists:
+                        broken_symlinks.append((os.path.join(sites_enabled, entry.name), target))
+        finally:
+            if dir_fd is not None:
+                os.close(dir_fd)
+    
+    # Vérification des répertoires Nginx
+    missing_dirs = []
+    for parent, child_paths in _NGINX_DIRS:
+        if not os.path.exists(parent):
+            missing_dirs.append(parent)
+            missing_dirs.extend(child_paths)
+            continue
+        for child_path in child_paths:
+            if not os.path.exists(child_path):
+                missing_dirs.append(child_path)
+    
+    # Vérification de certbot (optionnel)
+    warnings = []
+    if not _is_installed("certbot"):
+        warnings.append("Certbot is not installed. SSL certificate management will not be available.")
+    
+    return broken_symlinks, missing_dirs, warnings
+
+def _apply_fixes(issues: Tuple[List[Tuple[str, str]], List[str], List[str]], assume_yes: bool) -> bool:
+    """
+    Report the issues found by _collect_issues and fix them after a single confirmation.
+    
+    Args:
+        issues: Result of _collect_issues()
+        assume_yes: Apply the fixes without asking
+        
+    Returns:
+        True if the environment is usable, False otherwise
+    """
+    broken_symlinks, missing_dirs, _ = issues
+    if not broken_symlinks and not missing_dirs:
+        return True
+    
+    for link, target in broken_symlinks:
+        print(f"⚠️ Found broken symlink: {link} → {target}")
+    if missing_dirs:
+        print("⚠️ Some required Nginx directories are missing:")
+        for dir_path in missing_dirs:
+            print(f"  {dir_path}")
+    
+    count = len(broken_symlinks) + len(missing_dirs)
+    if not assume_yes:
+        choice = input(f"Apply {count} fix{'es' if count > 1 else ''}? (Y/n): ").strip().lower()
+        if choice and choice not in ('y', 'yes'):
+            if missing_dirs:
+                print("❌ Cannot continue without required directories.")
+                return False
+            return True
+    
+    # Broken links all live in sites-enabled: unlink them by name relative to one fd
+    dir_fd = None
+    if broken_symlinks and _USE_DIR_FD:
+        try:
+            dir_fd = os.open(_SITES_ENABLED, os.O_RDONLY | os.O_DIRECTORY)
+        except OSError:
+            pass
+    try:
+        for link, _ in broken_symlinks:
+            try:
+                if dir_fd is None:
+                    os.unlink(link)
+                else:
+                    os.unlink(os.path.basename(link), dir_fd=dir_fd)
+                print(f"[-] Removed broken symlink: {link}")
+            except Exception as e:
+                print(f"❌ Could not remove symlink: {e}")
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+    
+    # Create missing directories. They are listed parent-first, so a plain
+    # mkdir is enough; makedirs is only needed when an ancestor outside our
+    # list (e.g. /var/log) is missing too. Errors are reported by the verify pass.
+    errors = {}
+    for dir_path in missing_dirs:
+        print(f"Creating {dir_path}")
+        try:
+            os.mkdir(dir_path, 0o755)
+        except FileNotFoundError:
+            try:
+                os.makedirs(dir_path, 0o755, exist_ok=True)
+            except OSError as e:
+                errors[dir_path] = e
+        except OSError as e:
+            errors[dir_path] = e
+    
+    failed = [dir_path for dir_path in missing_dirs if not os.path.isdir(dir_path)]
+    for dir_path in failed:
+        print(f"❌ Failed to create directory {dir_path}: {errors.get(dir_path, 'not a directory')}")
+    
+    return not failed
+
+def check_environment(assume_yes: bool = False) -> bool:
     """
     Check if the environment meets the requirements.
     
+    All problems are collected first and fixed after one confirmation.
+    
+    Args:
+        assume_yes: Apply fixes without prompting
+        
     Returns:
         True if environment is valid, False otherwise
     """
     # Vérification des privilèges root
-    if os.geteuid() != 0:
+    if _EUID != 0:
         print("🚨 This tool requires root privileges. Please run with sudo.")
         return False
         
     # Vérification de l'installation de nginx
-    nginx_installed = shutil.which("nginx") is not None
+    nginx_installed = _is_installed("nginx")
     if not nginx_installed:
         print("❌ Nginx is not installed or not in PATH.")
         return False
     
-    # Vérification des répertoires Nginx
-    nginx_dirs = [
-        Path('/etc/nginx'),
-        Path('/etc/nginx/sites-available'),
-        Path('/etc/nginx/sites-enabled'),
-        Path('/var/log/nginx')
-    ]
-    
-    # Check for inconsistent symlinks in sites-enabled
-    sites_enabled = Path('/etc/nginx/sites-enabled')
-    sites_available = Path('/etc/nginx/sites-available')
-    if sites_enabled.exists():
-        for symlink in sites_enabled.glob('*.conf'):
-            if symlink.is_symlink():
-                target = Path(os.readlink(symlink))
-                if not target.is_absolute():
-                    # Convert relative path to absolute
-                    target = (symlink.parent / target).resolve()
-                if not target.exists():
-                    print(f"⚠️ Found broken symlink: {symlink} → {target}")
-                    choice = input(f"Remove broken symlink? (y/N): ").strip().lower()
-                    if choice in ('y', 'yes'):
-                        try:
-                            symlink.unlink()
-                            print(f"[-] Removed broken symlink: {symlink}")
-                        except Exception as e:
-                            print(f"❌ Could not remove symlink: {e}")
-    
-    # Create missing directories
-    missing_dirs = []
-    for dir_path in nginx_dirs:
-        if not dir_path.exists():
-            missing_dirs.append(dir_path)
-    
-    if missing_dirs:
-        print("⚠️ Some required Nginx directories are missing.")
-        choice = input("Create missing directories? (Y/n): ").strip().lower()
-        if not choice or choice in ('y', 'yes'):
-            for dir_path in missing_dirs:
-                try:
-                    print(f"Creating {dir_path}")
-                    dir_path.mkdir(parents=True, exist_ok=True)
-                except Exception as e:
-                    print(f"❌ Failed to create directory {dir_path}: {e}")
-                    return False
-        else:
-            print("❌ Cannot continue without required directories.")
-            return False
+    issues = _collect_issues()
+    if not _apply_fixes(issues, assume_yes):
+        return False
     
-    # Vérification de certbot (optionnel)
-    certbot_installed = shutil.which("certbot") is not None
-    if not certbot_installed:
-        print("⚠️ Certbot is not installed. SSL certificate management will not be available.")
+    for warning in issues[2]:
+        print(f"⚠️ {warning}")
     
     return True
 
-def run_command(cmd: List[str]) -> bool:
+def run_command(cmd: List[str], capture: bool = True) -> bool:
     """
     Run a command and handle exceptions safely.
     
+    Output is kept as bytes and only decoded when the command fails. The
+    command line is logged at DEBUG level, failures at ERROR level.
+    
     Args:
         cmd: Command list to run
+        capture: Capture stdout for the failure report; when False it is
+            discarded. stderr is always captured.
         
     Returns:
         True if command succeeded, False otherwise
     """
+    import subprocess
+
     try:
-        print(f"Running: {' '.join(cmd)}")
+        log.debug("Running: %s", cmd)
         
+        # An absolute executable and close_fds=False let subprocess spawn the child
+        # with posix_spawn() (vfork-based) rather than fork()+exec(). Our own fds are
+        # non-inheritable by default (PEP 446), so none leak into the child.
         process = subprocess.run(
             cmd, 
-            stdout=subprocess.PIPE,
+            executable=_executable(cmd[0]) or cmd[0],
+            stdout=subprocess.PIPE if capture else subprocess.DEVNULL,
             stderr=subprocess.PIPE,
-            text=True,
+            close_fds=False,
             check=False
         )
         
         if process.returncode != 0:
-            print(f"Command failed with exit code {process.returncode}")
+            log.error("Command failed with exit code %d: %s", process.returncode, " ".join(cmd))
             if process.stderr:
-                print(f"Error output: {process.stderr.strip()}")
+                log.error("Error output: %s", process.stderr.decode('utf-8', 'replace').strip())
             if process.stdout:
-                print(f"Standard output: {process.stdout.strip()}")
+                log.error("Standard output: %s", process.stdout.decode('utf-8', 'replace').strip())
             return False
             
         return True
         
     except Exception as e:
-        print(f"Error executing command {' '.join(cmd)}: {e}")
+        log.error("Error executing command %s: %s", " ".join(cmd), e)
         return False
         
 def is_root() -> bool:
     """
     Check if the script is running with root privileges.
     
+    Uses the effective UID read once at import.
+    
     Returns:
         True if running as root, False otherwise
     """
-    return os.geteuid() == 0
+    return _EUID == 0